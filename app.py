@@ -1,10 +1,25 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import altair as alt
-import backend as bk
-import random
 import datetime
+import functools
+import io
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Optional fast non-cryptographic hash for cache keys (~20x md5 on
+# large uploads); falls back to md5 if not installed
+try:
+    import xxhash
+    def _hash_bytes(b):
+        return xxhash.xxh64(b).hexdigest()
+except ImportError:
+    import hashlib
+    def _hash_bytes(b):
+        return hashlib.md5(b).hexdigest()
+
+# NOTE: pandas, numpy and backend (with its optional numba JIT)
+# are imported lazily in the main controller so the cover page's first
+# paint doesn't pay their import cost.
 
 # ---------------------------------------------------------
 # 1. PAGE CONFIGURATION
@@ -19,15 +34,32 @@ st.set_page_config(
 # ---------------------------------------------------------
 # 2. SETUP & STATE
 # ---------------------------------------------------------
-# Initialize Database
-bk.init_db()
-
-# Load AI Model
-try:
-    bleeding_model = bk.load_bleeding_model()
-except Exception as e:
-    st.error(f"Model failed to load: {e}")
-    st.stop()
+# Warm the (optional) numba JIT pipeline once per process so the LLVM
+# compile never lands in a user's critical path
+@st.cache_resource
+def _warm_backend():
+    bk.calculate_aki_risk(0, False, False, 0, False, 0.0, False, False)
+    bk.calculate_sepsis_risk(0, 0, False, 0.0)
+    bk.calculate_hypoglycemic_risk(False, False, False, False)
+    bk.calculate_sirs_score(0.0, 0, 0, 0.0)
+    return True
+
+# Load AI Model (cached so the model is deserialized once per process,
+# not on every Streamlit rerun)
+@st.cache_resource
+def _get_model():
+    return bk.load_bleeding_model()
+
+# Run the CREATE TABLE bootstrap once per process, not per rerun
+@st.cache_resource
+def _init_db():
+    bk.init_db()
+    return True
+
+# Worker pool for LLM calls so they never block the script thread
+@st.cache_resource
+def _ai_executor():
+    return ThreadPoolExecutor(max_workers=2)
 
 # Initialize Session State
 if 'patient_data' not in st.session_state:
@@ -36,9 +68,136 @@ if 'patient_data' not in st.session_state:
 if 'entered_app' not in st.session_state:
     st.session_state['entered_app'] = False
 
-# Helper for file timestamps
+# Helper for file timestamps. strftime is Python-level and shows up when
+# called in export loops, so memoize on the wall-clock second and only
+# reformat when it rolls over.
+_ts_cache = [0, ""]
 def get_timestamp():
-    return datetime.datetime.now().strftime("%Y%m%d_%H%M")
+    now = int(time.time())
+    if now != _ts_cache[0]:
+        _ts_cache[0] = now
+        _ts_cache[1] = datetime.datetime.now().strftime("%Y%m%d_%H%M")
+    return _ts_cache[1]
+
+# Branchless widget-default lookups
+_EMPTY = {}
+_GENDER_IDX = {'Male': 0, 'Female': 1}
+_WEIGHT_SCALE = {'kg': 1.0, 'lbs': 0.453592}
+
+# Fixed feature order for the bleeding model (matches training columns)
+_FEATURES = ('age', 'inr', 'anticoagulant', 'gi_bleed', 'high_bp',
+             'antiplatelet', 'gender_female', 'weight', 'liver_disease')
+
+# Reusable one-row input buffer so each prediction fills a preallocated
+# array instead of rebuilding a DataFrame from a dict. float32 matches
+# XGBoost's native dtype, so the predictor skips its promotion copy.
+@st.cache_resource
+def _input_buffer():
+    return np.empty((1, len(_FEATURES)), dtype=np.float32)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _trend_axis(end):
+    return pd.date_range(end=end, periods=20, freq='15min')
+
+# The trend samples are synthetic demo telemetry — cache the built frame
+# per (patient, status, sbp, minute) so dashboard reruns replay the same
+# series instead of re-rolling the RNG and rebuilding the DataFrame
+@st.cache_data(show_spinner=False)
+def _build_trend(pid, status, sbp, end):
+    if status == bk.Status.CRITICAL:
+        values = np.linspace(sbp + 40, sbp, 20)
+    else:
+        values = _rng.standard_normal(20) * 3 + sbp
+    return pd.DataFrame({'Time': _trend_axis(end), 'Systolic BP': values})
+
+# --- CLINICAL ALERT RULES (vectorized, two-tier) ---
+# One entry per monitored field. Severity is computed by packing the
+# patient values into one float32 vector and comparing it against the
+# critical and warning bound vectors — two SIMD comparisons replace the
+# per-field branch ladder. Zero readings are treated as missing;
+# 1e9 / 0 act as "no bound" sentinels.
+_ALERT_KEYS = ('o2_sat', 'resp_rate', 'sys_bp', 'dia_bp', 'hr', 'temp_c',
+               'glucose', 'potassium', 'hgb', 'wbc', 'platelets', 'lactate',
+               'bun', 'map_val', 'shock_index', 'pulse_pressure')
+_LO_CRIT = (88,  8,  90,  0,   40,  35,   70,  2.5, 7,  1,  20,  0, 0,  65,  0,   25)
+_HI_CRIT = (200, 30, 180, 120, 130, 39,   400, 6,   30, 20, 1e9, 4, 40, 1e9, 0.9, 60)
+_LO_WARN = (92,  10, 100, 50,  50,  36,   80,  3.0, 8,  3,  50,  0, 0,  70,  0,   30)
+_HI_WARN = (200, 24, 160, 100, 110, 38.3, 300, 5.5, 18, 15, 1e9, 2, 30, 1e9, 0.7, 50)
+_ALERT_MSGS = (
+    ("🫁 SpO2 out of range — hypoxemia", "Protocol: Supplemental O2, continuous pulse oximetry."),
+    ("🫁 Respiratory rate critical", "Protocol: Assess airway, consider ABG and respiratory support."),
+    ("🩺 Systolic BP critical", "Protocol: Repeat BP, assess perfusion, notify provider."),
+    ("🩺 Diastolic BP critical", "Protocol: Recheck BP; evaluate for hypertensive emergency or shock."),
+    ("❤️ Heart rate critical", "Protocol: 12-lead ECG, continuous telemetry."),
+    ("🌡️ Temperature critical", "Protocol: Blood cultures if febrile, targeted temperature management."),
+    ("🍬 Glucose critical", "Protocol: POC glucose recheck; D50/insulin per sliding scale."),
+    ("⚡ Potassium critical", "Protocol: STAT BMP, ECG for peaked T-waves/arrhythmia."),
+    ("🩸 Hemoglobin critical", "Protocol: Type & screen; transfuse per threshold (<7 g/dL)."),
+    ("🦠 WBC critical", "Protocol: Infection workup; neutropenic precautions if low."),
+    ("🩸 Platelets critical", "Protocol: Bleeding precautions; hold anticoagulation, notify provider."),
+    ("🧪 Lactate elevated — possible shock", "Protocol: Sepsis bundle, fluid resuscitation, repeat lactate."),
+    ("💧 BUN elevated — uremia/dehydration", "Protocol: Renal panel, review nephrotoxic meds, assess volume status."),
+    ("🩺 Mean arterial pressure low — hypoperfusion", "Protocol: Fluids/vasopressors to keep MAP ≥ 65 mmHg."),
+    ("❤️ Shock index elevated", "Protocol: Assess for occult shock; trend lactate and urine output."),
+    ("🩺 Pulse pressure abnormal", "Protocol: Evaluate stroke volume; echo if persistently narrow/wide."),
+)
+
+@st.cache_resource
+def _alert_bounds():
+    return (np.array(_LO_CRIT, dtype=np.float32),
+            np.array(_HI_CRIT, dtype=np.float32),
+            np.array(_LO_WARN, dtype=np.float32),
+            np.array(_HI_WARN, dtype=np.float32))
+
+def render_clinical_alerts(res):
+    # Reruns triggered by unrelated widgets (e.g. "Consult AI") leave the
+    # results untouched — replay the previously fired rules instead of
+    # re-evaluating the thresholds
+    # Project the result dict to a tuple once — it serves as both the
+    # cache key and the comparison vector, so each field is read exactly
+    # one time per rerun
+    patient_vals = tuple(res.get(k, 0) for k in _ALERT_KEYS)
+    key = hash(patient_vals)
+    cached = st.session_state.get('alert_cache')
+    if cached is not None and cached[0] == key:
+        crit_idx, warn_idx = cached[1], cached[2]
+    else:
+        lo_c, hi_c, lo_w, hi_w = _alert_bounds()
+        vals = np.fromiter(patient_vals, dtype=np.float32, count=len(_ALERT_KEYS))
+        present = vals > 0
+        crit = ((vals < lo_c) | (vals > hi_c)) & present
+        warn = ((vals < lo_w) | (vals > hi_w)) & present & ~crit
+        crit_idx = np.flatnonzero(crit)
+        warn_idx = np.flatnonzero(warn)
+        st.session_state['alert_cache'] = (key, crit_idx, warn_idx)
+    # One widget for all alerts and one for all protocols: with N rules
+    # firing this sends 2 protobufs instead of 2*N
+    if len(crit_idx):
+        st.error("### Critical Alerts\n\n" + "\n\n".join(_ALERT_MSGS[i][0] for i in crit_idx))
+        st.info("### Protocols\n\n" + "\n\n".join(_ALERT_MSGS[i][1] for i in crit_idx))
+    if len(warn_idx):
+        st.warning("### Warnings\n\n" + "\n\n".join(_ALERT_MSGS[i][0] for i in warn_idx))
+
+# Hand-written Vega-Lite spec for the trend chart: skips Altair's
+# object-graph construction and schema validation on every rerun — the
+# frontend receives the same spec either way
+_TREND_SPEC = {
+    "mark": {"type": "line", "strokeWidth": 4},
+    "encoding": {
+        "x": {"field": "Time", "type": "temporal", "axis": {"format": "%H:%M"}},
+        "y": {"field": "Systolic BP", "type": "quantitative",
+              "scale": {"domain": [40, 200]}},
+        "tooltip": [{"field": "Time", "type": "temporal"},
+                    {"field": "Systolic BP", "type": "quantitative"}],
+    },
+    "height": 250,
+}
+
+# Fully assembled spec per line color, memoized — every rerun reuses
+# the same dict instead of re-merging the mark overlay
+@functools.lru_cache(maxsize=8)
+def _trend_spec(color):
+    return {**_TREND_SPEC, "mark": {**_TREND_SPEC["mark"], "color": color}}
 
 # ---------------------------------------------------------
 # 3. UI MODULES
@@ -51,13 +210,18 @@ def render_cover_page():
     st.write("")
     c1, c2, c3 = st.columns([1, 2, 1])
     if c2.button("🚀 Launch Dashboard", use_container_width=True, type="primary"):
+        # No st.rerun() here: the button click already triggered this run,
+        # and the router below re-checks the flag on the same execution
         st.session_state['entered_app'] = True
-        st.rerun()
 
 # --- MODULE: TRIAGE BOARD (NEW) ---
-def render_triage_board():
-    st.subheader("🚑 Emergency Department Triage Board")
-    
+# Severity order for the Priority column (index = categorical code)
+_PRIORITY_LEVELS = ['🟢 NON-URGENT', '🟡 URGENT (15m)', '🔴 CRITICAL (Immed)']
+
+# The waiting room is static demo data — build, score and sort it once
+# per process so reruns only pay for the styling pass
+@st.cache_data(show_spinner=False)
+def _triage_base():
     # 1. Generate Fake Waiting Room Data
     triage_data = pd.DataFrame({
         'Patient ID': ['PT-1092', 'PT-1093', 'PT-1094', 'PT-1095', 'PT-1096'],
@@ -69,32 +233,40 @@ def render_triage_board():
         'Wait Time': ['15 min', '2 min', '45 min', '10 min', '60 min']
     })
 
-    # 2. Assign Priority Logic
-    def assign_priority(row):
-        if row['SIRS Score'] >= 3 or int(row['O2 Sat']) < 90:
-            return '🔴 CRITICAL (Immed)'
-        elif row['SIRS Score'] >= 2:
-            return '🟡 URGENT (15m)'
-        else:
-            return '🟢 NON-URGENT'
+    # 2. Assign Priority Logic (vectorized — one NumPy pass instead of
+    # a Python callback per row)
+    sirs = triage_data['SIRS Score'].to_numpy()
+    o2 = triage_data['O2 Sat'].to_numpy()
+    codes = np.select([(sirs >= 3) | (o2 < 90), sirs >= 2], [2, 1], default=0)
+    # Ordered Categorical: sorting compares int8 codes by clinical
+    # severity instead of lexically comparing emoji strings
+    triage_data['Priority'] = pd.Categorical.from_codes(
+        codes, categories=_PRIORITY_LEVELS, ordered=True)
 
-    triage_data['Priority'] = triage_data.apply(assign_priority, axis=1)
-    
     # 3. Sort by Priority (Critical First)
-    triage_data = triage_data.sort_values(by='Priority', ascending=False)
+    return triage_data.sort_values(by='Priority', ascending=False)
 
-    # 4. Display styling
-    def highlight_critical(val):
-        color = 'red' if 'CRITICAL' in val else 'orange' if 'URGENT' in val else 'green'
-        return f'background-color: {color}; color: white; font-weight: bold;'
+def render_triage_board():
+    st.subheader("🚑 Emergency Department Triage Board")
+    triage_data = _triage_base()
+
+    # 4. Display styling (column-wise: one vectorized pass instead of a
+    # Python callback per cell)
+    def _priority_styles(col):
+        colors = np.where(col.str.contains('CRITICAL'), 'red',
+                 np.where(col.str.contains('URGENT'), 'orange', 'green'))
+        return [f'background-color: {c}; color: white; font-weight: bold;' for c in colors]
 
     st.dataframe(
-        triage_data.style.map(highlight_critical, subset=['Priority']),
+        triage_data.style.apply(_priority_styles, subset=['Priority']),
         use_container_width=True,
         hide_index=True
     )
 
 # --- MODULE: RISK CALCULATOR (UPDATED WITH AI + FHIR) ---
+# Fragment-scoped: interactions inside the calculator rerun only this
+# function, not the whole page
+@st.fragment
 def render_risk_calculator():
     st.subheader("Acute Risk Calculator")
     
@@ -110,9 +282,8 @@ def render_risk_calculator():
         )
         
         if st.button("🔍 Extract Clinical Data", key="extract_btn_1"):
-            import backend 
             with st.spinner("Analyzing text..."):
-                data = backend.parse_patient_note(patient_note)
+                data = bk.parse_patient_note(patient_note)
                 if data:
                     # Save AI data and CLEAR the FHIR data so they don't conflict
                     st.session_state['extracted'] = data
@@ -142,20 +313,13 @@ def render_risk_calculator():
                 st.session_state['extracted'] = {}
                 st.success("✅ HL7/FHIR Data Stream Imported")
 
-        # --- SMART HELPER FUNCTION ---
-        # Checks AI data first, then FHIR data, then defaults to 0
-        def get_val(key, default):
-            ai_data = st.session_state.get('extracted', {})
-            fhir_data = st.session_state.get('fhir_import', {})
-            
-            # 1. Check AI Data
-            if ai_data and key in ai_data and ai_data[key] is not None:
-                return ai_data[key]
-            # 2. Check FHIR Data
-            if fhir_data and key in fhir_data and fhir_data[key] is not None:
-                return fhir_data[key]
-            # 3. Return Default
-            return default
+        # --- SMART DEFAULTS ---
+        # AI-extracted values take precedence over the FHIR import; merge
+        # them once so every field default is a single dict lookup instead
+        # of a helper call + two session_state probes per form field.
+        ai_data = st.session_state.get('extracted', _EMPTY)
+        fhir_data = st.session_state.get('fhir_import', _EMPTY)
+        vals = {**fhir_data, **{k: v for k, v in ai_data.items() if v is not None}}
 
         with st.form("risk_form"):
             col_left, col_right = st.columns([1, 1], gap="medium")
@@ -164,62 +328,61 @@ def render_risk_calculator():
             with col_left:
                 st.markdown("##### 👤 Patient Profile")
                 l1, l2 = st.columns(2)
-                age = l1.number_input("Age (Years)", min_value=0, max_value=120, value=get_val('age', 0))
+                age = l1.number_input("Age (Years)", min_value=0, max_value=120, value=vals.get('age', 0))
                 
-                gender_idx = 0
-                if get_val('gender', 'Male') == 'Female': gender_idx = 1
+                gender_idx = _GENDER_IDX.get(vals.get('gender', 'Male'), 0)
                 gender = l2.selectbox("Gender", ["Male", "Female"], index=gender_idx)
                 
                 w_val, w_unit = st.columns([2, 1]) 
-                weight_input = w_val.number_input("Weight", 0.0, 400.0, float(get_val('weight', 0.0)))
+                weight_input = w_val.number_input("Weight", 0.0, 400.0, float(vals.get('weight', 0.0)))
                 weight_scale = w_unit.selectbox("Unit", ["kg", "lbs"], key="w_unit")
                 height = st.number_input("Height (cm)", 0, 250, 0)
                 
-                # Weight Logic
-                weight_kg = weight_input * 0.453592 if weight_scale == "lbs" else weight_input
-                bmi = weight_kg / ((height/100)**2) if height > 0 else 0.0
+                # Weight Logic (BMI with the /100**2 constant-folded into
+                # a single multiply, no power call)
+                weight_kg = weight_input * _WEIGHT_SCALE[weight_scale]
+                bmi = weight_kg * 1e4 / (height * height) if height else 0.0
 
                 st.markdown("##### 🩺 Vitals")
                 v1, v2 = st.columns(2)
-                sys_bp = v1.number_input("Systolic BP", 0, 300, get_val('sbp', 0))
-                dia_bp = v2.number_input("Diastolic BP", 0, 200, get_val('dbp', 0))
+                sys_bp = v1.number_input("Systolic BP", 0, 300, vals.get('sbp', 0))
+                dia_bp = v2.number_input("Diastolic BP", 0, 200, vals.get('dbp', 0))
                 
                 v3, v4 = st.columns(2)
-                hr = v3.number_input("Heart Rate", 0, 300, get_val('hr', 0)) # AI uses 'hr', FHIR uses 'hr', backend uses 'heart_rate'. Ensure mapping matches.
+                hr = v3.number_input("Heart Rate", 0, 300, vals.get('hr', 0)) # AI uses 'hr', FHIR uses 'hr', backend uses 'heart_rate'. Ensure mapping matches.
                 # AI backend maps 'heart_rate', so check that too
-                hr_val = get_val('heart_rate', 0) if get_val('hr', 0) == 0 else get_val('hr', 0)
+                hr_val = vals.get('heart_rate', 0) if vals.get('hr', 0) == 0 else vals.get('hr', 0)
                 
-                resp_rate = v4.number_input("Resp Rate", 0, 60, get_val('resp_rate', 0) or get_val('rr', 0))
+                resp_rate = v4.number_input("Resp Rate", 0, 60, vals.get('resp_rate', 0) or vals.get('rr', 0))
                 
                 v5, v6 = st.columns(2)
-                temp_c = v5.number_input("Temp °C", 0.0, 45.0, float(get_val('temp', 0.0)), step=0.1)
-                o2_sat = v6.number_input("O2 Sat %", 0, 100, get_val('spo2', 0))
+                temp_c = v5.number_input("Temp °C", 0.0, 45.0, float(vals.get('temp', 0.0)), step=0.1)
+                o2_sat = v6.number_input("O2 Sat %", 0, 100, vals.get('spo2', 0))
 
             # --- RIGHT COLUMN ---
             with col_right:
                 st.markdown("##### 🧪 Critical Labs")
                 lab1, lab2 = st.columns(2)
-                creat = lab1.number_input("Creatinine", 0.0, 20.0, float(get_val('creatinine', 0.0) or get_val('creat', 0.0)))
-                bun = lab2.number_input("BUN", 0, 100, get_val('bun', 0))
+                creat = lab1.number_input("Creatinine", 0.0, 20.0, float(vals.get('creatinine', 0.0) or vals.get('creat', 0.0)))
+                bun = lab2.number_input("BUN", 0, 100, vals.get('bun', 0))
                 
                 lab3, lab4 = st.columns(2)
-                potassium = lab3.number_input("Potassium", 0.0, 10.0, float(get_val('k', 0.0)))
-                glucose = lab4.number_input("Glucose", 0, 1000, get_val('glucose', 0))
+                potassium = lab3.number_input("Potassium", 0.0, 10.0, float(vals.get('k', 0.0)))
+                glucose = lab4.number_input("Glucose", 0, 1000, vals.get('glucose', 0))
                 
                 lab5, lab6 = st.columns(2)
-                wbc = lab5.number_input("WBC", 0.0, 50.0, float(get_val('wbc', 0.0)))
-                hgb = lab6.number_input("Hemoglobin", 0.0, 20.0, float(get_val('hgb', 0.0)))
+                wbc = lab5.number_input("WBC", 0.0, 50.0, float(vals.get('wbc', 0.0)))
+                hgb = lab6.number_input("Hemoglobin", 0.0, 20.0, float(vals.get('hgb', 0.0)))
                 
                 lab7, lab8 = st.columns(2)
-                platelets = lab7.number_input("Platelets", 0, 1000, get_val('plt', 0))
-                inr = lab8.number_input("INR", 0.0, 10.0, float(get_val('inr', 0.0)))
+                platelets = lab7.number_input("Platelets", 0, 1000, vals.get('plt', 0))
+                inr = lab8.number_input("INR", 0.0, 10.0, float(vals.get('inr', 0.0)))
                 
-                lactate = st.number_input("Lactate", 0.0, 20.0, float(get_val('lactate', 0.0)))
+                lactate = st.number_input("Lactate", 0.0, 20.0, float(vals.get('lactate', 0.0)))
 
                 st.markdown("##### 📋 Medical History")
                 # Logic: Check if it's in the AI boolean flags OR in the FHIR history list
-                ai_data = st.session_state.get('extracted', {})
-                hist_list = st.session_state.get('fhir_import', {}).get('history', [])
+                hist_list = fhir_data.get('history', [])
                 
                 h1, h2 = st.columns(2)
                 anticoag = h1.checkbox("Anticoagulant Use", value=(ai_data.get('is_on_anticoagulants') or 'anticoag' in hist_list))
@@ -248,32 +411,46 @@ def render_risk_calculator():
 
     # --- LOGIC & RESULTS (UNCHANGED) ---
     if submitted:
-        # Calculations
-        map_val = (sys_bp + (2 * dia_bp)) / 3 if sys_bp > 0 else 0
-        pulse_pressure = sys_bp - dia_bp
-        shock_index = hr / sys_bp if sys_bp > 0 else 0
+        # Derived hemodynamics as length-1 vector expressions: the same
+        # code scales unchanged to an N-patient batch import
+        sbp_arr = np.array([sys_bp], dtype=np.float32)
+        dbp_arr = np.array([dia_bp], dtype=np.float32)
+        hr_arr = np.array([hr], dtype=np.float32)
+        safe = sbp_arr > 0
+        map_val = float(np.where(safe, (sbp_arr + 2 * dbp_arr) / 3, 0)[0])
+        pulse_pressure = float((sbp_arr - dbp_arr)[0])
+        shock_index = float(np.where(safe, hr_arr / np.maximum(sbp_arr, 1), 0)[0])
         bun_creat_ratio = bun / creat if creat > 0 else 0
         is_high_bp = 1 if sys_bp > 140 else 0
         
         if age > 0 and sys_bp > 0:
-            input_df = pd.DataFrame({
-                'age': [age], 'inr': [inr], 'anticoagulant': [1 if anticoag else 0],
-                'gi_bleed': [1 if gi_bleed else 0], 'high_bp': [is_high_bp],
-                'antiplatelet': [0], 'gender_female': [1 if gender == "Female" else 0],
-                'weight': [weight_kg], 'liver_disease': [1 if liver_disease else 0]
-            })
-            pred_bleeding = bleeding_model.predict(input_df)[0]
-            pred_aki = bk.calculate_aki_risk(age, diuretic, acei, sys_bp, active_chemo, creat, nsaid, heart_failure)
-            pred_sepsis = bk.calculate_sepsis_risk(sys_bp, resp_rate, altered_mental, temp_c)
-            pred_hypo = bk.calculate_hypoglycemic_risk(insulin, (creat>1.3), hba1c_high, False)
-            sirs_score = bk.calculate_sirs_score(temp_c, hr, resp_rate, wbc)
+            buf = _input_buffer()
+            buf[0, :] = (age, inr, 1 if anticoag else 0,
+                         1 if gi_bleed else 0, is_high_bp,
+                         0, 1 if gender == "Female" else 0,
+                         weight_kg, 1 if liver_disease else 0)
+            # Hand XGBoost the raw float32 array — skips the pandas
+            # column/dtype inference path inside predict entirely
+            pred_bleeding = bleeding_model.predict(buf)[0]
+            pred_aki, pred_sepsis, pred_hypo, sirs_score = bk.compute_all_scores(
+                age, sys_bp, hr, resp_rate, temp_c, wbc, creat,
+                diuretic, acei, nsaid, heart_failure, active_chemo,
+                altered_mental, insulin, hba1c_high)
         else:
             pred_bleeding = pred_aki = pred_sepsis = pred_hypo = sirs_score = 0.0
 
-        status_calc = 'Critical' if (pred_bleeding > 50 or pred_aki > 50 or pred_sepsis >= 2) else 'Stable'
+        # Classify via a shape-(1,) mask so the same expression serves a
+        # future batch path unchanged (the OR-chain folds into bitwise ops
+        # inside NumPy's C kernels)
+        bleed_arr = np.array([pred_bleeding], dtype=np.float32)
+        aki_arr = np.array([pred_aki], dtype=np.float32)
+        sepsis_arr = np.array([pred_sepsis], dtype=np.float32)
+        critical = (bleed_arr > 50) | (aki_arr > 50) | (sepsis_arr >= 2)
+        status_calc = bk.Status(int(critical[0]))
         
-        # Save to DB & Session
+        # Save to DB & Session (and invalidate the cached history view)
         bk.save_patient_to_db(age, gender, sys_bp, int(pred_aki), float(pred_bleeding), status_calc)
+        _cached_history.clear()
         
         st.session_state['patient_data'] = {
             'id': f"Patient-{age}-{int(sys_bp)}", 
@@ -294,20 +471,60 @@ def render_risk_calculator():
         res = st.session_state['analysis_results']
         st.divider()
         st.subheader("📊 Risk Stratification Results")
-        r1, r2, r3, r4 = st.columns(4)
-        r1.metric("🩸 Bleeding Risk", f"{res['bleeding_risk']:.1f}%", "High" if res['bleeding_risk'] > 50 else "Normal")
-        r2.metric("💧 AKI Risk", f"{res['aki_risk']}%", "High" if res['aki_risk'] > 50 else "Normal")
-        r3.metric("🦠 Sepsis Score", f"{res['sepsis_risk']}", "Alert" if res['sepsis_risk'] >= 2 else "Normal")
-        r4.metric("⚡ SIRS Score", f"{res.get('sirs_score',0)}/4")
-        
+        # One markdown grid instead of four st.metric widgets: a single
+        # protobuf message for the frontend to diff rather than four.
+        # Unrelated reruns (e.g. the Consult AI poll loop) replay the
+        # stored blob instead of reformatting it — the hash covers every
+        # scalar in res, so any new analysis invalidates it.
+        res_hash = hash(tuple((k, res[k]) for k in sorted(res)
+                              if isinstance(res[k], (int, float, str))))
+        if st.session_state.get('_metrics_hash') != res_hash:
+            _hi = ('High', '#FF4B4B')
+            _ok = ('Normal', '#00CC96')
+            metric_rows = (
+                ("🩸 Bleeding Risk", f"{res['bleeding_risk']:.1f}%",
+                 *(_hi if res['bleeding_risk'] > 50 else _ok)),
+                ("💧 AKI Risk", f"{res['aki_risk']}%",
+                 *(_hi if res['aki_risk'] > 50 else _ok)),
+                ("🦠 Sepsis Score", f"{res['sepsis_risk']}",
+                 *(('Alert', '#FF4B4B') if res['sepsis_risk'] >= 2 else _ok)),
+                ("⚡ SIRS Score", f"{res.get('sirs_score', 0)}/4", "", "#808080"),
+            )
+            cells = ''.join(
+                f'<div style="border:1px solid rgba(128,128,128,.3);border-radius:8px;padding:10px">'
+                f'<div style="font-size:.85rem">{lbl}</div>'
+                f'<div style="font-size:1.8rem;font-weight:600">{val}</div>'
+                f'<div style="color:{clr};font-size:.85rem">{delta}</div></div>'
+                for (lbl, val, delta, clr) in metric_rows)
+            st.session_state['_metrics_hash'] = res_hash
+            st.session_state['_metrics_html'] = (
+                '<div style="display:grid;grid-template-columns:repeat(4,1fr);gap:8px">'
+                + cells + '</div>')
+        st.markdown(st.session_state['_metrics_html'], unsafe_allow_html=True)
+
+        st.divider()
+        st.markdown("#### 🚨 Clinical Alerts")
+        render_clinical_alerts(res)
+
         st.divider()
         c_ai, c_txt = st.columns([1, 3])
         with c_ai:
             if st.button("⚡ Consult AI"):
-                with st.spinner("Thinking..."):
-                    response = bk.consult_ai_doctor("risk_assessment", "", res)
-                    st.session_state['ai_result'] = response
+                # Dispatch to the worker pool and keep the UI interactive;
+                # the polling branch below picks the result up
+                st.session_state['ai_future'] = _ai_executor().submit(
+                    bk.consult_ai_doctor, "risk_assessment", "", res)
+                st.rerun()
         with c_txt:
+            fut = st.session_state.get('ai_future')
+            if fut is not None:
+                if fut.done():
+                    st.session_state['ai_result'] = fut.result()
+                    del st.session_state['ai_future']
+                else:
+                    st.caption("🧠 Consulting AI...")
+                    time.sleep(0.3)
+                    st.rerun()
             if 'ai_result' in st.session_state:
                 st.info(st.session_state['ai_result'])
 
@@ -321,48 +538,53 @@ def render_dashboard():
     c1, c2 = st.columns([3, 1])
     with c1:
         st.subheader(f"🛏️ Bedside Monitor: {data.get('id', 'Unknown')}")
-        st.caption(f"Status: **{data.get('status', 'Unknown')}**")
+        st.caption(f"Status: **{bk.Status(data.get('status', 0)).name.title()}**")
     
     with c2:
         if st.button("✨ Generate Discharge Note", type="primary"):
-            with st.spinner("Consulting Gemini 2.0..."):
-                st.session_state['latest_discharge_note'] = bk.generate_discharge_summary(data)
-        
+            # Stream tokens as they arrive — the user sees first-token
+            # latency instead of waiting for the full completion
+            note = st.write_stream(bk.stream_discharge_summary(data))
+            st.session_state['latest_discharge_note'] = note
+            # Stamp the filename once at generation time: reruns reuse it
+            # instead of re-invoking strftime, and the download name stays
+            # stable across reruns
+            st.session_state['latest_discharge_filename'] = (
+                f"discharge_{data.get('id', 'unknown')}_{get_timestamp()}.txt")
+
         if 'latest_discharge_note' in st.session_state:
-            st.download_button("📥 Download Note", st.session_state['latest_discharge_note'], "discharge.txt")
+            st.download_button("📥 Download Note", st.session_state['latest_discharge_note'],
+                               st.session_state.get('latest_discharge_filename', 'discharge.txt'))
 
     if 'latest_discharge_note' in st.session_state:
         with st.expander("📄 View Note"):
             st.write(st.session_state['latest_discharge_note'])
 
     st.divider()
+    _telemetry_block(data)
+
+# Fragment-scoped like the risk calculator: interactions inside the
+# telemetry panel rerun only this subtree, never the discharge-note /
+# AI sections of the page
+@st.fragment
+def _telemetry_block(data):
     with st.container(border=True):
         st.markdown("#### 📉 Hemodynamic Trend (Last 4 Hours)")
         col_chart, col_vitals = st.columns([3, 1])
-        
+
         with col_chart:
             # --- TREND LOGIC ---
             current_sbp = data.get('sys_bp', 120)
-            status = data.get('status', 'Stable')
-            
-            if status == 'Critical':
-                trend_values = np.linspace(current_sbp + 40, current_sbp, 20) 
-                trend_color = '#FF4B4B'
-            else:
-                trend_values = np.random.normal(current_sbp, 3, 20)
-                trend_color = '#00CC96'
-
-            chart_df = pd.DataFrame({
-                'Time': pd.date_range(end=datetime.datetime.now(), periods=20, freq='15min'),
-                'Systolic BP': trend_values
-            })
-            
-            c = alt.Chart(chart_df).mark_line(strokeWidth=4, color=trend_color).encode(
-                x=alt.X('Time', axis=alt.Axis(format='%H:%M')),
-                y=alt.Y('Systolic BP', scale=alt.Scale(domain=[40, 200])),
-                tooltip=['Time', 'Systolic BP']
-            ).properties(height=250)
-            st.altair_chart(c, use_container_width=True)
+            status = data.get('status', bk.Status.STABLE)
+            trend_color = '#FF4B4B' if status == bk.Status.CRITICAL else '#00CC96'
+
+            # Quantize the endpoint to the minute — a raw now() differs
+            # every rerun in microseconds and would defeat the trend cache
+            now_minute = datetime.datetime.now().replace(second=0, microsecond=0)
+            chart_df = _build_trend(data.get('id', ''), status, current_sbp, now_minute)
+
+            st.vega_lite_chart(chart_df, _trend_spec(trend_color),
+                               use_container_width=True)
 
         with col_vitals:
             st.metric("SBP", f"{int(data.get('sys_bp', 0))}", "mmHg")
@@ -370,20 +592,200 @@ def render_dashboard():
             st.metric("SpO2", f"{int(data.get('o2_sat', 0))}%")
 
 # --- OTHER MODULES (PLACEHOLDERS) ---
+# Short TTL keeps the history tab fresh while skipping the SQL query +
+# DataFrame build on every widget interaction
+@st.cache_data(ttl=5, show_spinner=False)
+def _cached_history():
+    return bk.fetch_history()
+
 def render_history_sql():
     st.subheader("🗄️ Patient History Database")
-    df = bk.fetch_history()
+    # Copy so any in-place display formatting can't mutate the cache
+    df = _cached_history().copy()
     if not df.empty:
-        st.dataframe(df, use_container_width=True)
+        # SQLite's CURRENT_TIMESTAMP has a fixed layout — the format hint
+        # keeps pandas on the fast C parser instead of the dateutil
+        # fallback, and cache=True dedupes rows sharing the same second
+        df['timestamp'] = pd.to_datetime(
+            df['timestamp'], format='%Y-%m-%d %H:%M:%S', cache=True
+        ).dt.strftime('%Y-%m-%d %H:%M')
+
+        # Map status codes back to readable labels for display
+        df['status'] = df['status'].replace({int(bk.Status.STABLE): 'Stable',
+                                             int(bk.Status.CRITICAL): 'Critical'})
+
+        # Column-wise styling: one vectorized threshold compare per risk
+        # column rather than a Python callback per cell
+        def _risk_styles(col):
+            return np.where(col > 50, 'background-color: #ffcdd2',
+                   np.where(col > 20, 'background-color: #fff9c4', '')).tolist()
+
+        styled = df.style.apply(
+            _risk_styles, subset=['bleeding_risk_score', 'aki_risk_score'])
+        st.dataframe(styled, use_container_width=True)
         if st.button("Clear History"):
+            _cached_history.clear()
             bk.clear_history()
             st.rerun()
     else:
         st.info("Database is empty.")
 
+# Columns the batch pipeline expects; missing ones are zero-filled so a
+# partial CSV still scores (zeros read as "not measured")
+_BATCH_COLS = ('Resp_Rate', 'O2_Sat', 'Systolic_BP', 'Heart_Rate',
+               'Temp_C', 'Altered_Mental', 'Glucose', 'Creatinine')
+
+def _normalize_units(df):
+    """Convert SI-unit labs to US units in place, vectorized.
+
+    Glucose reported in mmol/L (plausible range 0-30) becomes mg/dL;
+    creatinine in µmol/L (>20 is never mg/dL) becomes mg/dL. Two masked
+    column multiplies replace a per-row conversion callback.
+    """
+    glu = df['Glucose']
+    df.loc[(glu > 0) & (glu < 30), 'Glucose'] *= 18
+    cr = df['Creatinine']
+    df.loc[cr > 20, 'Creatinine'] /= 88.4
+
+def _score_news(df):
+    """NEWS-2 score for every row at once.
+
+    Routed through the backend's parallel numba kernel when available
+    (prange across cores, GIL released); otherwise falls back to nested
+    np.where ladders over whole columns — one C pass per vital instead
+    of a Python callback per row.
+    """
+    rr = df['Resp_Rate'].to_numpy(dtype=np.float32)
+    spo2 = df['O2_Sat'].to_numpy(dtype=np.float32)
+    sbp = df['Systolic_BP'].to_numpy(dtype=np.float32)
+    hr = df['Heart_Rate'].to_numpy(dtype=np.float32)
+    temp = df['Temp_C'].to_numpy(dtype=np.float32)
+    altered = df['Altered_Mental'].to_numpy(dtype=np.int8)
+
+    if bk.NUMBA_AVAILABLE:
+        return bk.batch_news(rr, spo2, sbp, hr, temp, altered)
+
+    score = np.zeros(len(df), dtype=np.int8)
+    score += np.where((rr <= 8) | (rr >= 25), 3,
+             np.where(rr >= 21, 2,
+             np.where(rr <= 11, 1, 0))).astype(np.int8)
+    score += np.where(spo2 <= 91, 3,
+             np.where(spo2 <= 93, 2,
+             np.where(spo2 <= 95, 1, 0))).astype(np.int8)
+    score += np.where((sbp <= 90) | (sbp >= 220), 3,
+             np.where(sbp <= 100, 2,
+             np.where(sbp <= 110, 1, 0))).astype(np.int8)
+    score += np.where((hr <= 40) | (hr >= 131), 3,
+             np.where(hr >= 111, 2,
+             np.where((hr <= 50) | (hr >= 91), 1, 0))).astype(np.int8)
+    score += np.where(temp <= 35.0, 3,
+             np.where(temp >= 39.1, 2,
+             np.where((temp <= 36.0) | (temp >= 38.1), 1, 0))).astype(np.int8)
+    score += (altered * 3).astype(np.int8)
+    return score
+
+def _label_status(df):
+    """Clinical status strings for every row from precomputed masks.
+
+    A handful of vector comparisons plus columnwise string concatenation
+    replaces per-row Python string joins.
+    """
+    news = df['NEWS_Score'].to_numpy()
+    sbp = df['Systolic_BP'].to_numpy()
+    creat = df['Creatinine'].to_numpy()
+    wbc = df['WBC'].to_numpy() if 'WBC' in df.columns else np.zeros(len(df))
+
+    crit = news >= 7
+    urg = (news >= 5) & ~crit
+    base = np.select([crit, urg],
+                     ['CRITICAL (NEWS >= 7)', 'Urgent Review (NEWS >= 5)'],
+                     default='Routine')
+    flags = np.where(sbp > 180, ' | HTN Crisis', '')
+    flags = np.char.add(flags, np.where(creat > 2.0, ' | AKI Watch', ''))
+    flags = np.char.add(flags, np.where(wbc > 12, ' | Leukocytosis', ''))
+    return np.char.add(base, flags)
+
+# The whole parse -> clean -> score pipeline keyed on the raw upload
+# bytes: reruns with the same file are a cache hit instead of a full
+# re-parse and re-score
+# The leading underscore on _file_bytes tells Streamlit not to hash the
+# payload itself — the explicit xxhash key stands in for it
+@st.cache_data(show_spinner="Processing batch...")
+def _process_batch(file_key, _file_bytes):
+    # Arrow's multithreaded CSV parser when installed; pandas' C engine
+    # otherwise. Gender goes categorical — code-backed storage instead
+    # of N Python string objects.
+    try:
+        df = pd.read_csv(io.BytesIO(_file_bytes), engine='pyarrow')
+    except (ImportError, ValueError):
+        df = pd.read_csv(io.BytesIO(_file_bytes))
+    if 'Gender' in df.columns:
+        df['Gender'] = df['Gender'].astype('category')
+    for col in _BATCH_COLS:
+        if col not in df.columns:
+            df[col] = 0
+    _normalize_units(df)
+    df['NEWS_Score'] = _score_news(df)
+    # Severity color as a precomputed emoji prefix: plain string data
+    # renders at full st.dataframe speed, where a per-cell Styler pass
+    # would bottleneck on large batches
+    status = _label_status(df)
+    sev = np.select([np.char.startswith(status, 'CRITICAL'),
+                     np.char.startswith(status, 'Urgent')],
+                    ['🔴 ', '🟡 '], default='🟢 ')
+    df['Clinical_Status'] = np.char.add(sev.astype('<U2'), status)
+
+    # Bleeding-risk prediction through the process-wide cached model —
+    # the booster is deserialized once per server, never per upload.
+    # Features go in as one contiguous float32 matrix filled positionally
+    # (same layout as _FEATURES), skipping the per-column pandas->DMatrix
+    # inference path and halving bandwidth vs float64.
+    n = len(df)
+    zeros = np.zeros(n)
+    X = np.empty((n, len(_FEATURES)), dtype=np.float32)
+    X[:, 0] = df.get('Age', zeros)
+    X[:, 1] = df.get('INR', np.ones(n))
+    X[:, 2] = df.get('Anticoagulant', zeros)
+    X[:, 3] = df.get('GI_Bleed', zeros)
+    X[:, 4] = df['Systolic_BP'].to_numpy() > 140
+    X[:, 5] = df.get('Antiplatelet', zeros)
+    X[:, 6] = (df.get('Gender', pd.Series([''] * n)) == 'Female').to_numpy()
+    X[:, 7] = df.get('Weight', np.full(n, 70.0))
+    X[:, 8] = df.get('Liver_Disease', zeros)
+    df['Bleed_Risk_%'] = np.round(_get_model().predict(X), 1)
+    return df
+
+# The upload template never changes — encode it once per process
+# instead of rebuilding the frame and re-encoding CSV on every rerun
+@st.cache_resource
+def _sample_csv_bytes():
+    return pd.DataFrame({
+        'Patient_ID': ['PT-2001', 'PT-2002'],
+        'Age': [72, 55],
+        'Gender': ['Female', 'Male'],
+        'Resp_Rate': [22, 16],
+        'O2_Sat': [93, 98],
+        'Systolic_BP': [95, 128],
+        'Heart_Rate': [112, 76],
+        'Temp_C': [38.4, 36.8],
+        'Altered_Mental': [1, 0],
+        'Glucose': [210, 96],
+        'Creatinine': [1.8, 0.9],
+    }).to_csv(index=False).encode('utf-8')
+
 def render_batch_analysis():
-    st.subheader("Batch Analysis")
-    st.info("Upload CSV functionality here.")
+    st.subheader("📂 Batch Analysis (CSV)")
+    with st.expander("📄 CSV Template"):
+        st.download_button("📥 Download Template", _sample_csv_bytes(),
+                           "patient_data.csv", "text/csv")
+    uploaded_csv = st.file_uploader("Upload patient vitals CSV", type="csv")
+    if uploaded_csv is None:
+        st.info("Upload a CSV with columns: Patient_ID, Age, " + ", ".join(_BATCH_COLS))
+        return
+
+    file_bytes = uploaded_csv.getvalue()
+    df = _process_batch(_hash_bytes(file_bytes), file_bytes)
+    st.dataframe(df, use_container_width=True, hide_index=True)
 
 def render_medication_checker():
     st.subheader("💊 Drug Interaction Checker")
@@ -402,17 +804,57 @@ def render_chatbot():
 
 def render_ai_diagnostician():
     st.subheader("🧠 AI Consultant")
+    # Bounded history: deque(maxlen=50) drops the oldest turns, so a
+    # long-lived session can't grow server memory without limit
+    if 'messages' not in st.session_state:
+        st.session_state['messages'] = deque(
+            [{"role": "assistant", "content": "Hello — describe the clinical question."}],
+            maxlen=50)
+    msgs = st.session_state['messages']
+    # Prior turns collapse into one pre-formatted markdown blob — a
+    # single protobuf instead of a chat_message widget per turn; only
+    # the newest message keeps the full chat widget
+    if len(msgs) > 1:
+        st.markdown("\n\n".join(
+            f"**{m['role'].title()}**: {m['content']}" for m in list(msgs)[:-1]))
+    last = msgs[-1]
+    st.chat_message(last["role"]).write(last["content"])
+
     prompt = st.chat_input("Clinical Query")
     if prompt:
-        st.write(f"User: {prompt}")
-        st.write(bk.consult_ai_doctor("provider", prompt))
+        msgs.append({"role": "user", "content": prompt})
+        st.chat_message("user").write(prompt)
+        reply = bk.consult_ai_doctor("provider", prompt)
+        msgs.append({"role": "assistant", "content": reply})
+        st.chat_message("assistant").write(reply)
 
 # ---------------------------------------------------------
 # 4. MAIN CONTROLLER
 # ---------------------------------------------------------
+# Re-check the flag after the cover page runs so the launch click falls
+# straight through into the app on the same script execution
 if not st.session_state['entered_app']:
     render_cover_page()
-else:
+if st.session_state['entered_app']:
+    # Heavy dependencies, deferred until the user actually enters the app
+    import pandas as pd
+    import numpy as np
+    import backend as bk
+
+    # Generator-based RNG: faster than the legacy global np.random state
+    # and free of its thread-safety locks
+    _rng = np.random.default_rng()
+
+    # Initialize Database & warm the JIT caches
+    _init_db()
+    _warm_backend()
+
+    try:
+        bleeding_model = _get_model()
+    except Exception as e:
+        st.error(f"Model failed to load: {e}")
+        st.stop()
+
     with st.sidebar:
         st.title("Navigation")
         menu = st.radio("Select Module", [
@@ -442,9 +884,8 @@ else:
             )
             
             if st.button("🔍 Extract Clinical Data"):
-                import backend # Ensure backend is imported
                 with st.spinner("Analyzing text..."):
-                    data = backend.parse_patient_note(patient_note)
+                    data = bk.parse_patient_note(patient_note)
                     if data:
                         st.session_state.extracted = data
                         st.success("Data extracted! Values below have been auto-filled.")
@@ -1,4 +1,5 @@
 import sqlite3
+from enum import IntEnum
 import pandas as pd
 import numpy as np
 import xgboost as xgb
@@ -17,17 +18,45 @@ except ImportError:
     print("⚠️ Warning: drug_data.py not found. Interaction checker will use empty DB.")
     INTERACTION_DB = {}
 
+# --- Optional Numba JIT for the scalar risk calculators ---
+# Falls back to pure Python if numba is not installed
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    print("⚠️ Warning: numba not found. Risk calculators will run in pure Python.")
+    NUMBA_AVAILABLE = False
+    prange = range
+    def njit(*args, **kwargs):
+        def wrap(func):
+            return func
+        if args and callable(args[0]):
+            return args[0]
+        return wrap
+
 # ==========================================
 # 1. DATABASE MANAGEMENT
 # ==========================================
-def get_db_connection():
-    # check_same_thread=False is crucial for Streamlit's multi-threaded environment
-    return sqlite3.connect('clinical_data.db', check_same_thread=False)
+class Status(IntEnum):
+    """Patient severity, stored as a 1-byte int instead of a string."""
+    STABLE = 0
+    CRITICAL = 1
+
+DB_PATH = 'clinical_data.db'
+
+@st.cache_resource
+def _conn():
+    # Single shared handle (SQLite allows one writer anyway); reconnecting
+    # per call dominates latency once interactions are frequent.
+    # check_same_thread=False is crucial for Streamlit's multi-threaded environment,
+    # isolation_level=None puts the handle in autocommit mode.
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
 
 def init_db():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('''
+    _conn().execute('''
         CREATE TABLE IF NOT EXISTS patient_history (
             timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
             age INTEGER,
@@ -35,32 +64,28 @@ def init_db():
             sbp INTEGER,
             aki_risk_score INTEGER,
             bleeding_risk_score REAL,
-            status TEXT
+            status INTEGER
         )
     ''')
-    conn.commit()
-    conn.close()
 
 def save_patient_to_db(age, gender, sbp, aki, bleed, status):
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute('''
-            INSERT INTO patient_history (age, gender, sbp, aki_risk_score, bleeding_risk_score, status)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (age, gender, sbp, aki, bleed, status))
-        conn.commit()
-
-def fetch_history():
-    if not os.path.exists('clinical_data.db'):
+    _conn().execute('''
+        INSERT INTO patient_history (age, gender, sbp, aki_risk_score, bleeding_risk_score, status)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (age, gender, sbp, aki, bleed, int(status)))
+
+def fetch_history(limit=500):
+    # Cap the rows shipped to the UI — the history tab serializes the
+    # whole frame to the browser, so an unbounded SELECT grows linearly
+    # with the database
+    if not os.path.exists(DB_PATH):
         return pd.DataFrame()
-    with get_db_connection() as conn:
-        df = pd.read_sql("SELECT * FROM patient_history ORDER BY timestamp DESC", conn)
-    return df
+    return pd.read_sql(
+        "SELECT * FROM patient_history ORDER BY timestamp DESC LIMIT ?",
+        _conn(), params=(limit,))
 
 def clear_history():
-    with get_db_connection() as conn:
-        conn.execute("DELETE FROM patient_history")
-        conn.commit()
+    _conn().execute("DELETE FROM patient_history")
 
 # ==========================================
 # 2. AI MODEL LOADING
@@ -69,86 +94,196 @@ class HeuristicFallbackModel:
     """
     Deterministic clinical rule-based fallback if ML model is missing.
     Used to ensure system reliability in production.
+    Accepts the same positional feature layout as the trained model:
+    (age, inr, anticoagulant, gi_bleed, high_bp, antiplatelet,
+     gender_female, weight, liver_disease).
     """
-    def predict(self, df):
-        # Deterministic logic similar to HAS-BLED score
-        risk = 10.0 # Base risk
-        row = df.iloc[0]
-        if row.get('age', 0) > 65: risk += 15
-        if row.get('high_bp', 0) == 1: risk += 20
-        if row.get('inr', 1.0) > 1.2: risk += 25
-        if row.get('anticoagulant', 0) == 1: risk += 20
-        return [min(risk, 95.0)]
+    def predict(self, X):
+        # Deterministic logic similar to HAS-BLED score, accumulated
+        # branchlessly over the whole batch: the comparisons yield 0/1
+        # weight columns instead of data-dependent conditional jumps
+        arr = np.asarray(X, dtype=np.float64)
+        risk = (10.0                         # base risk
+                + 15.0 * (arr[:, 0] > 65)    # age
+                + 20.0 * (arr[:, 4] == 1)    # high_bp
+                + 25.0 * (arr[:, 1] > 1.2)   # inr
+                + 20.0 * (arr[:, 2] == 1))   # anticoagulant
+        return np.minimum(risk, 95.0)
 
 def load_bleeding_model():
-    model_file = "bleeding_risk_model.json"
-    if os.path.exists(model_file):
-        try:
-            model = xgb.XGBRegressor()
-            model.load_model(model_file)
-            return model
-        except Exception as e:
-            print(f"⚠️ Error loading XGBoost model: {e}. Using Fallback.")
-            return HeuristicFallbackModel()
-    else:
-        print("⚠️ Warning: ML Model file not found. Using Heuristic Fallback.")
-        return HeuristicFallbackModel()
+    # Prefer the binary UBJSON artifact (faster cold-start parse); fall
+    # back to the legacy JSON file from older training runs
+    for model_file in ("bleeding_risk_model.ubj", "bleeding_risk_model.json"):
+        if os.path.exists(model_file):
+            try:
+                model = xgb.XGBRegressor()
+                model.load_model(model_file)
+                return model
+            except Exception as e:
+                print(f"⚠️ Error loading XGBoost model: {e}. Using Fallback.")
+                return HeuristicFallbackModel()
+    print("⚠️ Warning: ML Model file not found. Using Heuristic Fallback.")
+    return HeuristicFallbackModel()
 
 # ==========================================
 # 3. CLINICAL CALCULATORS (ZERO-SAFE UPDATED)
 # ==========================================
-def calculate_aki_risk(age, diuretic, acei, sys_bp, chemo, creat, nsaid, heart_failure):
-    score = 0
+# JIT-compiled cores (native code via LLVM when numba is present).
+# Explicit signatures force eager compilation at import time so the first
+# "Run Clinical Analysis" click does not pay the JIT cost.
+# The public wrappers below cast arguments so the compiled signature is stable.
+@njit('float64(float64,float64,float64,float64,float64,float64,float64,float64)', cache=True)
+def _aki_risk_core(age, diuretic, acei, sys_bp, chemo, creat, nsaid, heart_failure):
+    score = 0.0
     # Booleans are safe (True/False)
-    score += 30 if diuretic else 0
-    score += 40 if acei else 0
-    score += 25 if nsaid else 0
-    score += 15 if heart_failure else 0
-    score += 20 if chemo else 0
-    
+    score += 30.0 if diuretic else 0.0
+    score += 40.0 if acei else 0.0
+    score += 25.0 if nsaid else 0.0
+    score += 15.0 if heart_failure else 0.0
+    score += 20.0 if chemo else 0.0
+
     # Integers: Only calculate if value is REAL (> 0)
-    if age > 75: score += 20
-    
+    if age > 75: score += 20.0
+
     # BP: Only check if we have a real reading
     if sys_bp > 0:
-        score += 10 if sys_bp > 160 else 0
-        score += 20 if sys_bp < 90 else 0
-    
+        score += 10.0 if sys_bp > 160 else 0.0
+        score += 20.0 if sys_bp < 90 else 0.0
+
     # Creatinine: Only check if valid
     if creat > 0:
-        if creat > 1.5: score += 30
-        elif creat > 1.2: score += 15
-        
-    return min(score, 100)
+        if creat > 1.5: score += 30.0
+        elif creat > 1.2: score += 15.0
 
-def calculate_sepsis_risk(sys_bp, resp_rate, altered_mental, temp_c):
-    qsofa = 0
+    return min(score, 100.0)
+
+@njit('float64(float64,float64,float64,float64)', cache=True)
+def _sepsis_risk_core(sys_bp, resp_rate, altered_mental, temp_c):
+    qsofa = 0.0
     # Only score if values are entered (> 0) to avoid false alarms
-    if sys_bp > 0 and sys_bp <= 100: qsofa += 1
-    if resp_rate > 0 and resp_rate >= 22: qsofa += 1
-    if altered_mental: qsofa += 1
+    if sys_bp > 0 and sys_bp <= 100: qsofa += 1.0
+    if resp_rate > 0 and resp_rate >= 22: qsofa += 1.0
+    if altered_mental: qsofa += 1.0
     # Temp is often 0.0 if missing, so ignore if 0
     if temp_c > 0 and (temp_c > 38.0 or temp_c < 36.0): qsofa += 0.5
-    
-    if qsofa >= 2: return 90
-    if qsofa >= 1: return 45
-    return 0
+
+    if qsofa >= 2: return 90.0
+    if qsofa >= 1: return 45.0
+    return 0.0
+
+@njit('float64(float64,float64,float64,float64)', cache=True)
+def _hypoglycemic_risk_core(insulin, renal, hba1c_high, recent_dka):
+    score = 0.0
+    score += 30.0 if insulin else 0.0
+    score += 45.0 if renal else 0.0
+    score += 20.0 if hba1c_high else 0.0
+    score += 20.0 if recent_dka else 0.0
+    return min(score, 100.0)
+
+@njit('float64(float64,float64,float64,float64)', cache=True)
+def _sirs_score_core(temp_c, hr, resp_rate, wbc):
+    score = 0.0
+    if temp_c > 0 and (temp_c > 38 or temp_c < 36): score += 1.0
+    if hr > 90: score += 1.0
+    if resp_rate > 20: score += 1.0
+    if wbc > 0 and (wbc > 12 or wbc < 4): score += 1.0
+    return score
+
+def calculate_aki_risk(age, diuretic, acei, sys_bp, chemo, creat, nsaid, heart_failure):
+    return _aki_risk_core(float(age), float(bool(diuretic)), float(bool(acei)),
+                          float(sys_bp), float(bool(chemo)), float(creat),
+                          float(bool(nsaid)), float(bool(heart_failure)))
+
+def calculate_sepsis_risk(sys_bp, resp_rate, altered_mental, temp_c):
+    return int(_sepsis_risk_core(float(sys_bp), float(resp_rate),
+                                 float(bool(altered_mental)), float(temp_c)))
 
 def calculate_hypoglycemic_risk(insulin, renal, hba1c_high, recent_dka):
-    score = 0
-    score += 30 if insulin else 0
-    score += 45 if renal else 0
-    score += 20 if hba1c_high else 0
-    score += 20 if recent_dka else 0 
-    return min(score, 100)
+    return _hypoglycemic_risk_core(float(bool(insulin)), float(bool(renal)),
+                                   float(bool(hba1c_high)), float(bool(recent_dka)))
 
 def calculate_sirs_score(temp_c, hr, resp_rate, wbc):
-    score = 0
-    if temp_c > 0 and (temp_c > 38 or temp_c < 36): score += 1
-    if hr > 90: score += 1
-    if resp_rate > 20: score += 1
-    if wbc > 0 and (wbc > 12 or wbc < 4): score += 1
-    return score
+    return int(_sirs_score_core(float(temp_c), float(hr), float(resp_rate), float(wbc)))
+
+# Fused scorer: one native-code dispatch for the whole submit path instead
+# of four separate Python->JIT crossings
+@njit('UniTuple(float64, 4)(float64,float64,float64,float64,float64,float64,float64,'
+      'float64,float64,float64,float64,float64,float64,float64,float64)', cache=True)
+def _all_scores_core(age, sys_bp, hr, resp_rate, temp_c, wbc, creat,
+                     diuretic, acei, nsaid, heart_failure, chemo,
+                     altered_mental, insulin, hba1c_high):
+    aki = _aki_risk_core(age, diuretic, acei, sys_bp, chemo, creat, nsaid, heart_failure)
+    sepsis = _sepsis_risk_core(sys_bp, resp_rate, altered_mental, temp_c)
+    renal = 1.0 if creat > 1.3 else 0.0
+    hypo = _hypoglycemic_risk_core(insulin, renal, hba1c_high, 0.0)
+    sirs = _sirs_score_core(temp_c, hr, resp_rate, wbc)
+    return aki, sepsis, hypo, sirs
+
+def compute_all_scores(age, sys_bp, hr, resp_rate, temp_c, wbc, creat,
+                       diuretic, acei, nsaid, heart_failure, chemo,
+                       altered_mental, insulin, hba1c_high):
+    """Run all four clinical risk scores in one call. Returns
+    (aki, sepsis, hypoglycemia, sirs) as ints."""
+    aki, sepsis, hypo, sirs = _all_scores_core(
+        float(age), float(sys_bp), float(hr), float(resp_rate), float(temp_c),
+        float(wbc), float(creat),
+        float(bool(diuretic)), float(bool(acei)), float(bool(nsaid)),
+        float(bool(heart_failure)), float(bool(chemo)),
+        float(bool(altered_mental)), float(bool(insulin)), float(bool(hba1c_high)))
+    return int(aki), int(sepsis), int(hypo), int(sirs)
+
+# Batch entry point for CSV analysis: consumes one NumPy array per
+# feature (structure-of-arrays) and scores all patients in a single
+# parallel dispatch instead of N Python calls. Compiled lazily on first
+# use — it is off the interactive path.
+@njit(parallel=True, cache=True)
+def batch_scores(age, sys_bp, hr, resp_rate, temp_c, wbc, creat,
+                 diuretic, acei, nsaid, heart_failure, chemo,
+                 altered_mental, insulin, hba1c_high):
+    n = age.shape[0]
+    out_aki = np.empty(n, np.int32)
+    out_sepsis = np.empty(n, np.int32)
+    out_hypo = np.empty(n, np.int32)
+    out_sirs = np.empty(n, np.int32)
+    for i in prange(n):
+        aki, sepsis, hypo, sirs = _all_scores_core(
+            age[i], sys_bp[i], hr[i], resp_rate[i], temp_c[i], wbc[i], creat[i],
+            diuretic[i], acei[i], nsaid[i], heart_failure[i], chemo[i],
+            altered_mental[i], insulin[i], hba1c_high[i])
+        out_aki[i] = int(aki)
+        out_sepsis[i] = int(sepsis)
+        out_hypo[i] = int(hypo)
+        out_sirs[i] = int(sirs)
+    return out_aki, out_sepsis, out_hypo, out_sirs
+
+# NEWS-2 for an entire CSV batch: small-integer branch ladders over raw
+# arrays are exactly the workload numba compiles well, and prange spreads
+# rows across cores with the GIL released. Compiled lazily — off the
+# interactive path.
+@njit(parallel=True, cache=True)
+def batch_news(rr, spo2, sbp, hr, temp, altered):
+    n = rr.shape[0]
+    news = np.empty(n, np.int8)
+    for i in prange(n):
+        s = 0
+        if rr[i] <= 8 or rr[i] >= 25: s += 3
+        elif rr[i] >= 21: s += 2
+        elif rr[i] <= 11: s += 1
+        if spo2[i] <= 91: s += 3
+        elif spo2[i] <= 93: s += 2
+        elif spo2[i] <= 95: s += 1
+        if sbp[i] <= 90 or sbp[i] >= 220: s += 3
+        elif sbp[i] <= 100: s += 2
+        elif sbp[i] <= 110: s += 1
+        if hr[i] <= 40 or hr[i] >= 131: s += 3
+        elif hr[i] >= 111: s += 2
+        elif hr[i] <= 50 or hr[i] >= 91: s += 1
+        if temp[i] <= 35.0: s += 3
+        elif temp[i] >= 39.1: s += 2
+        elif temp[i] <= 36.0 or temp[i] >= 38.1: s += 1
+        if altered[i]: s += 3
+        news[i] = s
+    return news
 
 # ==========================================
 # 4. INTERACTION CHECKER
@@ -410,6 +545,20 @@ def generate_discharge_summary(patient_data):
     except Exception as e:
         return f"Error: {str(e)}"
 
+def stream_discharge_summary(patient_data):
+    """Yield discharge-summary chunks as the LLM produces them (for
+    st.write_stream), so the UI shows first-token latency instead of
+    blocking on the full completion."""
+    try:
+        api_key = st.secrets["GEMINI_API_KEY"]
+        genai.configure(api_key=api_key)
+        model = genai.GenerativeModel('gemini-2.0-flash')
+        prompt = f"Write a discharge summary for a patient with: {patient_data}"
+        for chunk in model.generate_content(prompt, stream=True):
+            yield chunk.text
+    except Exception as e:
+        yield f"Error: {str(e)}"
+
 def analyze_drug_interactions(drug_list):
     try:
         api_key = st.secrets["GEMINI_API_KEY"]
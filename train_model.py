@@ -23,21 +23,19 @@ def train_and_save():
     })
 
     # Ground Truth Logic (Simulating Clinical Risk Rules like HAS-BLED)
-    def rules(row):
-        score = 0
-        score += 35 if row['anticoagulant'] else 0
-        score += 40 if row['inr'] > 3.5 else 0
-        score += 30 if row['gi_bleed'] else 0
-        score += 15 if row['antiplatelet'] else 0
-        score += 10 if row['age'] > 65 else 0  # Updated age threshold
-        score += 10 if row['high_bp'] else 0
-        score += 15 if row['liver_disease'] else 0
-        
-        # Add some random noise to simulate real-world biological variance
-        noise = np.random.normal(0, 3) 
-        return min(max(score + noise, 0), 100)
+    # Computed as one fused column expression over all 5000 rows — the
+    # rule weights multiply boolean columns directly, no per-row callback
+    score = (35 * data['anticoagulant']
+             + 40 * (data['inr'] > 3.5).astype(int)
+             + 30 * data['gi_bleed']
+             + 15 * data['antiplatelet']
+             + 10 * (data['age'] > 65).astype(int)  # Updated age threshold
+             + 10 * data['high_bp']
+             + 15 * data['liver_disease']).to_numpy(dtype=np.float32)
 
-    data['risk_score'] = data.apply(rules, axis=1)
+    # Add some random noise to simulate real-world biological variance
+    noise = np.random.normal(0, 3, n_samples).astype(np.float32)
+    data['risk_score'] = np.clip(score + noise, 0, 100)
 
     # --- THE CRITICAL FIX: Train/Test Split ---
     print("✂️ Splitting data into Training and Validation sets...")
@@ -49,16 +47,21 @@ def train_and_save():
 
     # Train
     print("🧠 Training XGBoost model...")
+    # Histogram tree method bins features instead of exact splits
+    # (O(N·F) vs O(N·F·log N)), and float32 inputs halve the memory
+    # bandwidth — same accuracy, several times faster fits
     model = xgb.XGBRegressor(
-        objective='reg:squarederror', 
-        n_estimators=150, 
-        max_depth=4, 
-        learning_rate=0.05
+        objective='reg:squarederror',
+        n_estimators=150,
+        max_depth=4,
+        learning_rate=0.05,
+        tree_method='hist',
+        device='cpu'
     )
-    model.fit(X_train, y_train)
+    model.fit(X_train.to_numpy(dtype=np.float32), y_train.to_numpy(dtype=np.float32))
 
     # Validate
-    preds = model.predict(X_test)
+    preds = model.predict(X_test.to_numpy(dtype=np.float32))
     rmse = np.sqrt(mean_squared_error(y_test, preds))
     r2 = r2_score(y_test, preds)
     
@@ -66,9 +69,10 @@ def train_and_save():
     print(f"   - RMSE: {rmse:.2f} (Average prediction error in risk points)")
     print(f"   - R² Score: {r2:.4f} (1.0 is perfect prediction)")
 
-    # Save
-    model.save_model("bleeding_risk_model.json")
-    print("💾 Model saved as 'bleeding_risk_model.json'")
+    # Save — binary UBJSON parses several times faster than textual JSON
+    # on every fresh app-server start
+    model.save_model("bleeding_risk_model.ubj")
+    print("💾 Model saved as 'bleeding_risk_model.ubj'")
 
 if __name__ == "__main__":
     train_and_save()